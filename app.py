@@ -1,10 +1,7 @@
 import streamlit as st
-from image_classifier import ImageClassification
+from image_classifier import ImageClassification, encode_pixels, preprocess_image
 from insights import get_insights_stream, detect_breed
-import pandas as pd
 from PIL import Image
-import time
-import io
 
 # Page configuration
 st.set_page_config(
@@ -16,8 +13,18 @@ st.set_page_config(
 # Initialize session state variables
 if "uploaded_image" not in st.session_state:
     st.session_state.uploaded_image = None
+if "uploaded_pixels" not in st.session_state:
+    st.session_state.uploaded_pixels = None
+if "classification_result" not in st.session_state:
+    st.session_state.classification_result = None
+if "uploaded_file_id" not in st.session_state:
+    st.session_state.uploaded_file_id = None
 if "analyzer_image" not in st.session_state:
     st.session_state.analyzer_image = None
+if "analyzer_pixels" not in st.session_state:
+    st.session_state.analyzer_pixels = None
+if "analyzer_file_id" not in st.session_state:
+    st.session_state.analyzer_file_id = None
 
 # Sidebar menu
 with st.sidebar:
@@ -39,7 +46,19 @@ if selected == 'Image Classification':
         )
 
         if uploaded_file is not None:
-            st.session_state.uploaded_image = Image.open(uploaded_file).convert("RGB")
+            # file_uploader returns the file on every rerun, not just the
+            # upload event — only decode, resize and preprocess (and reset
+            # the stored result) when a different file is actually selected
+            if st.session_state.uploaded_file_id != uploaded_file.file_id:
+                img = Image.open(uploaded_file).convert("RGB")
+                # CLIP only sees 224x224, so shrink phone-sized photos up
+                # front instead of letting the processor resize them per call
+                img.thumbnail((256, 256), Image.BILINEAR)
+                st.session_state.uploaded_image = img
+                # Preprocess once at upload; classification reuses this tensor
+                st.session_state.uploaded_pixels = preprocess_image(img)
+                st.session_state.uploaded_file_id = uploaded_file.file_id
+                st.session_state.classification_result = None
             st.image(st.session_state.uploaded_image, caption="Uploaded Image", use_container_width=True)
 
     with col2:
@@ -47,20 +66,22 @@ if selected == 'Image Classification':
             if st.button("Classify Animal", type="primary"):
                 with st.spinner("Classifying..."):
                     classifier = ImageClassification()
-                    # Convert in-memory image to bytes for classifier
-                    img_bytes = io.BytesIO()
-                    st.session_state.uploaded_image.save(img_bytes, format="JPEG")
-                    img_bytes.seek(0)
-
-                    result = classifier.image_classification(img_bytes)
-
-                    st.success(f"Classification Result: **{result.capitalize()}**")
-
-                    if hasattr(classifier, 'last_confidence'):
-                        st.metric(
-                            label="Confidence",
-                            value=f"{classifier.last_confidence:.2%}"
-                        )
+                    # Classify from the pixels preprocessed at upload time
+                    result = classifier.classify_pixels(st.session_state.uploaded_pixels)
+                    # Format the display string once; reruns re-render it
+                    # from session state without redoing any work
+                    st.session_state.classification_result = (
+                        result.capitalize(),
+                        classifier.last_confidence
+                    )
+
+            if st.session_state.classification_result is not None:
+                display_label, confidence = st.session_state.classification_result
+                st.success(f"Classification Result: **{display_label}**")
+                st.metric(
+                    label="Confidence",
+                    value=f"{confidence:.2%}"
+                )
 
 # ---------------- DAIRY ANALYZER ----------------
 elif selected == 'The Dairy Analyzer':
@@ -76,7 +97,17 @@ elif selected == 'The Dairy Analyzer':
         )
 
         if uploaded_file is not None:
-            st.session_state.analyzer_image = Image.open(uploaded_file).convert("RGB")
+            # Same rerun behavior as the classification uploader: only
+            # redo the decode + preprocess when the file actually changes
+            if st.session_state.analyzer_file_id != uploaded_file.file_id:
+                img = Image.open(uploaded_file).convert("RGB")
+                # CLIP only sees 224x224, so shrink phone-sized photos up
+                # front instead of letting the processor resize them per call
+                img.thumbnail((256, 256), Image.BILINEAR)
+                st.session_state.analyzer_image = img
+                # Preprocess once at upload; the analyzer reuses this tensor
+                st.session_state.analyzer_pixels = preprocess_image(img)
+                st.session_state.analyzer_file_id = uploaded_file.file_id
             st.image(st.session_state.analyzer_image, caption="Uploaded Image", use_container_width=True)
 
             animal_type = st.radio(
@@ -92,27 +123,27 @@ elif selected == 'The Dairy Analyzer':
             status_text = st.empty()
             insights_data = None
 
-            # Convert image to bytes
-            img_bytes = io.BytesIO()
-            st.session_state.analyzer_image.save(img_bytes, format="JPEG")
-            img_bytes.seek(0)
+            # Encode the image once; breed detection reuses this embedding
+            image_features = encode_pixels(st.session_state.analyzer_pixels)
 
-            for update in get_insights_stream(animal_type.lower(), img_bytes):
+            # Consume updates as fast as the pipeline produces them; the
+            # progress bar tracks real work instead of a fixed sleep
+            for update in get_insights_stream(animal_type.lower(), image_features):
                 progress_bar.progress(update['progress'] / 100)
                 status_text.text(update['message'])
 
                 if 'data' in update:
                     insights_data = update['data']
 
-                time.sleep(0.5)
-
             if insights_data:
                 status_text.empty()
                 progress_bar.empty()
 
                 st.subheader(f"Deep Analyzer for this {animal_type}")
 
-                insights_df = pd.DataFrame([
+                # Plain list of rows — no DataFrame construction or dtype
+                # inference just to show 7 static values
+                st.table([
                     {"Metric": "Breed Type", "Value": insights_data["breed_type"]},
                     {"Metric": "Starting Expenditure", "Value": insights_data["starting_expenditure"]},
                     {"Metric": "Monthly Income", "Value": insights_data["monthly_income"]},
@@ -122,14 +153,4 @@ elif selected == 'The Dairy Analyzer':
                     {"Metric": "Farmers Percentage", "Value": insights_data["farmers_percent"]}
                 ])
 
-                st.dataframe(
-                    insights_df,
-                    column_config={
-                        "Metric": st.column_config.Column(width="medium"),
-                        "Value": st.column_config.Column(width="large")
-                    },
-                    hide_index=True,
-                    use_container_width=True
-                )
-
 
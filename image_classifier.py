@@ -1,31 +1,189 @@
-from transformers import pipeline
-from PIL import Image
-
-class ImageClassification:
-    def __init__(self):
-        # Load zero-shot image classification pipeline
-        self.classifier = pipeline(
-            task="zero-shot-image-classification",
-            model="openai/clip-vit-base-patch16"
-        )
-        # Candidate labels
-        self.labels = ["cow", "buffalo"]
-        self.last_confidence = 0.0
-
-    def image_classification(self, image_path: str) -> str:
-        """
-        Perform zero-shot classification on the input image.
-        Returns the label with the highest score.
-        """
-        # Open image
-        image = Image.open(image_path)
-
-        # Run zero-shot classification
-        results = self.classifier(image, candidate_labels=self.labels)
-
-        # Pick the highest score label and store confidence
-        if results and len(results) > 0:
-            self.last_confidence = results[0]["score"]
-            return results[0]["label"]
-        else:
-            return "Unknown"
\ No newline at end of file
+import hashlib
+import os
+
+import streamlit as st
+import torch
+from transformers import CLIPConfig, CLIPModel, CLIPProcessor
+from PIL import Image
+
+# Single CLIP backbone shared with insights.py (patch32 is faster and the
+# accuracy difference over patch16 is marginal for cow/buffalo)
+MODEL_NAME = "openai/clip-vit-base-patch32"
+
+@st.cache_resource(show_spinner=False)
+def _load_processor(model_name: str = MODEL_NAME):
+    # Cached separately from the model: the processor is tiny and
+    # preprocessing doesn't need the weights, so upload-time preprocessing
+    # must not trigger the full model load in the main script thread
+    return CLIPProcessor.from_pretrained(model_name)
+
+@st.cache_resource(show_spinner=False)
+def _load_clip(model_name: str = MODEL_NAME):
+    # Loading CLIP means deserializing ~600MB of weights, so keep one
+    # model alive across Streamlit sessions and reruns instead of
+    # rebuilding it every time the user presses "Classify Animal".
+    # The raw model + processor let us encode the image once and reuse
+    # the embedding, which the pipeline wrapper does not allow.
+    # On GPU, load in FP16: halves weight bandwidth and lets the ViT
+    # matmuls hit tensor cores. CPU stays FP32 (fp16 is slower there).
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    state_path = os.environ.get("CLIP_STATE_PATH", "/opt/clip_state.pt")
+    if os.path.exists(state_path):
+        # Fast boot path: mmap the native-dtype state dict written by
+        # warmup.py, then cast per device below (fp16 on GPU, fp32 on
+        # CPU) — same numerics as from_pretrained. Repeated container
+        # restarts hit the page cache instead of re-parsing safetensors,
+        # cutting load time to hundreds of ms.
+        config = CLIPConfig.from_pretrained(model_name)
+        model = CLIPModel(config)
+        state_dict = torch.load(state_path, mmap=True, weights_only=True)
+        model.load_state_dict(state_dict, assign=True)
+        model = model.to(device=device, dtype=dtype).eval()
+    else:
+        model = CLIPModel.from_pretrained(model_name, torch_dtype=dtype).to(device).eval()
+    processor = _load_processor(model_name)
+
+    # Compile the hot vision tower once at load time: kernel fusion and
+    # better attention kernels on the ViT forward pass. CUDA only —
+    # torch.compile is lazy, so CPU backend failures (no triton, no C++
+    # compiler on typical Streamlit Cloud hosts) would otherwise surface
+    # as a traceback at the user's first classify, not here.
+    # suppress_errors makes any remaining lazy failure fall back to eager.
+    if device == "cuda":
+        try:
+            torch._dynamo.config.suppress_errors = True
+            model.vision_model = torch.compile(model.vision_model, mode="reduce-overhead")
+        except Exception as e:
+            print(f"torch.compile unavailable, running eager: {e}")
+
+    return model, processor
+
+@st.cache_resource(show_spinner=False)
+def _result_cache():
+    # Content-addressed cache of past classification results, persisted on
+    # disk so repeat uploads of the same image skip CLIP entirely (demo
+    # sessions re-upload the same reference photos a lot). Falls back to a
+    # plain in-process dict if diskcache is unavailable.
+    try:
+        from diskcache import Cache
+        return Cache("/tmp/clip_cache", size_limit=32 * 1024 * 1024)
+    except Exception as e:
+        print(f"diskcache unavailable, using in-memory cache: {e}")
+        return {}
+
+def _tensor_key(prefix: str, tensor: torch.Tensor) -> str:
+    digest = hashlib.blake2b(tensor.cpu().numpy().tobytes(), digest_size=16).hexdigest()
+    return f"{prefix}:{digest}"
+
+def preprocess_image(image) -> torch.Tensor:
+    """
+    Run CLIPProcessor once on a PIL image and return the (1, 3, H, W)
+    pixel tensor. Preprocessing at upload time lets reruns and both app
+    flows share the same decoded, normalized pixels.
+    """
+    processor = _load_processor()
+    return processor(images=image, return_tensors="pt")["pixel_values"]
+
+def encode_pixels(pixel_values: torch.Tensor) -> torch.Tensor:
+    """
+    Run the CLIP vision tower on an already-preprocessed pixel tensor.
+    The forward pass goes through the shared micro-batching worker, so
+    concurrent sessions get batched together instead of queueing behind
+    each other. Returns a normalized (1, D) embedding that can be scored
+    against any set of label embeddings without re-encoding the image.
+    Repeat uploads of the same pixels hit the on-disk result cache and
+    skip the forward pass entirely.
+    """
+    from inference_worker import get_worker
+
+    cache = _result_cache()
+    key = _tensor_key("embed", pixel_values)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    features = get_worker().submit(pixel_values).result()
+    # Store on CPU so entries are device-agnostic and pickle cleanly;
+    # best_label aligns devices when scoring
+    cache[key] = features.cpu()
+    return features
+
+def encode_image(image) -> torch.Tensor:
+    """Convenience wrapper: preprocess a PIL image and encode it."""
+    return encode_pixels(preprocess_image(image))
+
+def encode_texts(labels) -> torch.Tensor:
+    """
+    Encode candidate labels through the CLIP text tower.
+    Returns a normalized (N, D) embedding matrix in the same order as labels.
+    """
+    model, processor = _load_clip()
+    prompts = [f"a photo of a {label}" for label in labels]
+    inputs = processor(text=prompts, return_tensors="pt", padding=True)
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    with torch.inference_mode():
+        features = model.get_text_features(**inputs)
+        return features / features.norm(dim=-1, keepdim=True)
+
+@st.cache_resource(show_spinner=False)
+def encode_texts_cached(labels: tuple) -> torch.Tensor:
+    """
+    Cached variant of encode_texts for static label sets.
+    The labels never change between requests, so the text tower only needs
+    to run once; the embeddings are stored as float16 to halve their size.
+    """
+    return encode_texts(list(labels)).to(torch.float16)
+
+def best_label(image_features: torch.Tensor, text_features: torch.Tensor, labels):
+    """
+    Dot the image embedding against the label embeddings and return the
+    winning (label, confidence) pair. Works straight off the logits with a
+    single argmax — no per-label dict allocation or sorting.
+    """
+    model, _ = _load_clip()
+    with torch.inference_mode():
+        text_features = text_features.to(device=image_features.device, dtype=image_features.dtype)
+        # Scale the cosine similarities by CLIP's learned temperature
+        # before softmax (as the model's own forward does) — raw cosines
+        # only differ by hundredths, which would flatten the confidence
+        logits = (image_features @ text_features.T).squeeze(0) * model.logit_scale.exp().item()
+        idx = int(logits.argmax(dim=-1))
+        confidence = float(logits.softmax(dim=-1)[idx])
+    return labels[idx], confidence
+
+class ImageClassification:
+    def __init__(self):
+        # Candidate labels
+        self.labels = ["cow", "buffalo"]
+        self.last_confidence = 0.0
+
+    def image_classification(self, image: Image.Image) -> str:
+        """
+        Perform zero-shot classification on an already-decoded PIL image.
+        Returns the label with the highest score.
+        """
+        return self.classify_pixels(preprocess_image(image))
+
+    def classify_pixels(self, pixel_values: torch.Tensor) -> str:
+        """
+        Classify from an already-preprocessed (1, 3, H, W) pixel tensor,
+        so callers that preprocess at upload time skip the PIL work here.
+        Returns the label with the highest score.
+        """
+        # Repeat uploads of the same image short-circuit the model
+        cache = _result_cache()
+        key = _tensor_key("classify", pixel_values)
+        cached = cache.get(key)
+        if cached is not None:
+            label, confidence = cached
+            self.last_confidence = confidence
+            return label
+
+        # One vision-tower forward pass, then argmax against the labels
+        image_features = encode_pixels(pixel_values)
+        text_features = encode_texts_cached(tuple(self.labels))
+        label, confidence = best_label(image_features, text_features, self.labels)
+        cache[key] = (label, confidence)
+        self.last_confidence = confidence
+        return label
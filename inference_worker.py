@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import streamlit as st
+import torch
+
+# Batching knobs, tunable per deployment without code changes
+MAX_BATCH = int(os.environ.get("CLIP_MAX_BATCH", "8"))
+BATCH_SLO_MS = float(os.environ.get("CLIP_BATCH_SLO_MS", "50"))
+
+class InferenceWorker:
+    """
+    Background thread that micro-batches CLIP image-encoding requests.
+    Each Streamlit session submits its preprocessed pixel tensor and waits
+    on a Future; the worker drains up to MAX_BATCH pending requests within
+    the BATCH_SLO_MS latency budget and runs them as one batched forward
+    pass, so concurrent users share a batch instead of paying N sequential
+    batch-1 passes.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.requests = queue.Queue()
+        self.use_cuda = model.device.type == "cuda"
+        if self.use_cuda:
+            # Pinned staging buffer + side stream so the host-to-device
+            # copy is a true cudaMemcpyAsync that can overlap the previous
+            # batch's compute instead of blocking the Python thread
+            image_size = model.config.vision_config.image_size
+            self.staging = torch.empty(
+                (MAX_BATCH, 3, image_size, image_size),
+                dtype=model.dtype, pin_memory=True
+            )
+            self.copy_stream = torch.cuda.Stream()
+            # Records when the async H2D copy of a batch has finished, so
+            # the pinned buffer is never refilled while still being read
+            self.copy_done = torch.cuda.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, pixel_values: torch.Tensor) -> Future:
+        """
+        Queue a (1, 3, H, W) pixel tensor for encoding.
+        The returned Future resolves to a normalized (1, D) image embedding.
+        """
+        future = Future()
+        self.requests.put((pixel_values, future))
+        return future
+
+    def _drain_batch(self):
+        # Block until at least one request arrives, then keep collecting
+        # until the batch is full or the latency budget runs out
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + BATCH_SLO_MS / 1000.0
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _gather_pixels(self, batch):
+        if self.use_cuda:
+            # The previous batch's cudaMemcpyAsync may still be reading the
+            # pinned buffer; wait for its completion event before refilling
+            self.copy_done.synchronize()
+            # Fill the pinned buffer (copy_ casts to the model dtype), then
+            # launch the transfer on the side stream and let the compute
+            # stream wait on it
+            for i, (pv, _) in enumerate(batch):
+                self.staging[i].copy_(pv[0])
+            with torch.cuda.stream(self.copy_stream):
+                pixel_values = self.staging[:len(batch)].to(self.model.device, non_blocking=True)
+            self.copy_done.record(self.copy_stream)
+            torch.cuda.current_stream().wait_stream(self.copy_stream)
+            # The tensor was allocated on the copy stream but is consumed
+            # on the compute stream; tell the caching allocator
+            pixel_values.record_stream(torch.cuda.current_stream())
+            return pixel_values
+        pixel_values = torch.cat([item[0] for item in batch], dim=0)
+        return pixel_values.to(dtype=self.model.dtype)
+
+    def _run(self):
+        while True:
+            batch = self._drain_batch()
+            try:
+                pixel_values = self._gather_pixels(batch)
+                with torch.inference_mode():
+                    features = self.model.get_image_features(pixel_values=pixel_values)
+                    features = features / features.norm(dim=-1, keepdim=True)
+                for i, (_, future) in enumerate(batch):
+                    future.set_result(features[i:i + 1])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+@st.cache_resource(show_spinner=False)
+def get_worker() -> InferenceWorker:
+    # Imported lazily so image_classifier (which calls into the worker)
+    # can be imported first without a cycle
+    from image_classifier import _load_clip
+
+    model, _ = _load_clip()
+    return InferenceWorker(model)
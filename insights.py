@@ -1,110 +1,146 @@
 import pandas as pd
+import streamlit as st
+import torch
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Generator
-from transformers import pipeline
-from PIL import Image
 import os
 
-# Load the breed classification model once
-try:
-    breed_classifier = pipeline(
-        task="zero-shot-image-classification",
-        model="openai/clip-vit-base-patch32"
-    )
-except Exception as e:
-    print(f"Error: Could not load breed detection model. {e}")
-    breed_classifier = None
-
-# Load CSV data files (you'll need to provide these files)
-try:
-    cow_breeds = pd.read_csv("cow_breeds.csv")
-    buff_breeds = pd.read_csv("buff_breeds.csv")
-except Exception as e:
-    print(f"Error: Could not load CSV data files. {e}")
-    # Create sample data for demonstration
-    cow_breeds = pd.DataFrame({
-        "Breed_Type": ["Holstein-Friesian", "Jersey", "Guernsey"],
-        "Cost_Of_Cow_INR": [50000, 45000, 40000],
-        "Monthly_Income_INR": [8000, 7500, 7000],
-        "Popular_Areas": ["Punjab, Haryana", "Global", "UK, US"],
-        "Milk_Per_Day_Litres": [20, 15, 12]
-    })
-    buff_breeds = pd.DataFrame({
-        "Breed_Type": ["Murrah", "Nili-Ravi", "Jaffarabadi"],
-        "Cost_per_Buffalo_INR": [60000, 55000, 65000],
-        "Monthly_Income_per_Buffalo_INR": [9000, 8500, 9500],
-        "Popular_Areas": ["Haryana, Punjab", "Pakistan, Punjab", "Gujarat"],
-        "Milk_per_Day_Liters": [18, 16, 20]
-    })
-
-def detect_breed(image_path: str, animal_type: str) -> str:
+# Small pool so breed detection and data lookup can run while progress
+# updates stream to the UI
+_insights_executor = ThreadPoolExecutor(max_workers=2)
+
+from image_classifier import best_label, encode_texts
+
+@st.cache_data
+def _load_breed_data():
     """
-    Detects the specific breed of the animal using the pre-loaded vision model.
-    Returns the breed name as a string.
+    Load the breed CSV files once, indexed by Breed_Type so per-request
+    lookups are O(1) hash probes instead of full-column boolean scans.
+    Falls back to sample data when the files are missing.
     """
-    if not breed_classifier:
-        return f"Default {animal_type.capitalize()}"
+    try:
+        cow = pd.read_csv("cow_breeds.csv")
+        buff = pd.read_csv("buff_breeds.csv")
+    except Exception as e:
+        print(f"Error: Could not load CSV data files. {e}")
+        # Create sample data for demonstration
+        cow = pd.DataFrame({
+            "Breed_Type": ["Holstein-Friesian", "Jersey", "Guernsey"],
+            "Cost_Of_Cow_INR": [50000, 45000, 40000],
+            "Monthly_Income_INR": [8000, 7500, 7000],
+            "Popular_Areas": ["Punjab, Haryana", "Global", "UK, US"],
+            "Milk_Per_Day_Litres": [20, 15, 12]
+        })
+        buff = pd.DataFrame({
+            "Breed_Type": ["Murrah", "Nili-Ravi", "Jaffarabadi"],
+            "Cost_per_Buffalo_INR": [60000, 55000, 65000],
+            "Monthly_Income_per_Buffalo_INR": [9000, 8500, 9500],
+            "Popular_Areas": ["Haryana, Punjab", "Pakistan, Punjab", "Gujarat"],
+            "Milk_per_Day_Liters": [18, 16, 20]
+        })
+    # Keep Breed_Type as a regular column too so records read the same way
+    cow = cow.set_index("Breed_Type", drop=False)
+    buff = buff.set_index("Breed_Type", drop=False)
+    return cow, buff
 
-    # Use appropriate column for candidate labels based on animal type
-    if animal_type.lower() == "cow" and cow_breeds is not None:
-        labels = cow_breeds["Breed_Type"].tolist()
-    elif animal_type.lower() == "buffalo" and buff_breeds is not None:
-        labels = buff_breeds["Breed_Type"].tolist()
-    else:
-        # Fallback to a basic list if CSV data is unavailable
-        labels = ["Holstein-Friesian", "Jersey", "Murrah", "Nili-Ravi"] if animal_type.lower() == "cow" else ["Murrah", "Nili-Ravi", "Jaffarabadi", "Bhadawari"]
+@st.cache_resource(show_spinner=False)
+def _label_table():
+    """
+    Encodes all candidate labels (animal types + every breed name) through
+    the CLIP text tower exactly once. The breed lists come from static CSV
+    data, so re-encoding them per request is pure waste. Returns the label
+    list, a float16 (N, D) embedding matrix, and per-animal slices into it.
+    """
+    cow_breeds, buff_breeds = _load_breed_data()
+    base = ["cow", "buffalo"]
+    cows = cow_breeds["Breed_Type"].tolist()
+    buffs = buff_breeds["Breed_Type"].tolist()
+    labels = base + cows + buffs
+    features = encode_texts(labels).to(torch.float16)
+    slices = {
+        "cow": slice(len(base), len(base) + len(cows)),
+        "buffalo": slice(len(base) + len(cows), len(labels)),
+    }
+    return labels, features, slices
 
-    if not labels:
-        return f"Unknown {animal_type.capitalize()}"
+def detect_breed(image_features, animal_type: str) -> str:
+    """
+    Detects the specific breed from an already-computed CLIP image embedding.
+    The image is encoded once by the caller; the label embeddings come from
+    the precomputed table, so no encoder runs here at all.
+    Returns the breed name as a string.
+    """
+    if image_features is None:
+        return f"Default {animal_type.capitalize()}"
 
     try:
-        image = Image.open(image_path)
-        results = breed_classifier(image, candidate_labels=labels)
-        
-        if results and len(results) > 0:
-            detected_breed = results[0]["label"]
-            return detected_breed
-        else:
-            return f"Uncertain {animal_type.capitalize()}"
+        all_labels, all_features, slices = _label_table()
+        breed_slice = slices.get(animal_type.lower())
+        if breed_slice is None or breed_slice.start == breed_slice.stop:
+            return f"Unknown {animal_type.capitalize()}"
+
+        labels = all_labels[breed_slice]
+        text_features = all_features[breed_slice]
+        detected_breed, _ = best_label(image_features, text_features, labels)
+        return detected_breed
     except Exception as e:
         print(f"Error during breed detection: {e}")
         return f"Error detecting breed"
 
+@st.cache_data
+def _insight_tables():
+    """
+    Pre-formats every breed's insight dict once at load time: the currency
+    strings, the x12 annual-income arithmetic and the str() coercions all
+    happen here instead of on every request. Returns dict-of-dicts keyed by
+    Breed_Type for cows and buffaloes.
+    """
+    cow_breeds, buff_breeds = _load_breed_data()
+    cow_insights = {}
+    for record in cow_breeds.itertuples(index=False):
+        monthly = int(getattr(record, "Monthly_Income_INR", 0))
+        cow_insights[str(record.Breed_Type)] = {
+            "breed_type": str(record.Breed_Type),
+            "starting_expenditure": f"₹{int(record.Cost_Of_Cow_INR):,}",
+            "annual_income": f"₹{monthly * 12:,}",
+            "farmers_percent": "--",
+            "popular_areas": str(getattr(record, "Popular_Areas", "N/A")),
+            "milk_per_day": f"{getattr(record, 'Milk_Per_Day_Litres', 'N/A')} Liters",
+            "monthly_income": f"₹{monthly:,}"
+        }
+
+    buff_insights = {}
+    for record in buff_breeds.itertuples(index=False):
+        monthly = int(getattr(record, "Monthly_Income_per_Buffalo_INR", 0))
+        buff_insights[str(record.Breed_Type)] = {
+            "breed_type": str(record.Breed_Type),
+            "starting_expenditure": f"₹{int(getattr(record, 'Cost_per_Buffalo_INR', 0)):,}",
+            "annual_income": f"₹{monthly * 12:,}",
+            "farmers_percent": "--",
+            "popular_areas": str(getattr(record, "Popular_Areas", "N/A")),
+            "milk_per_day": f"{getattr(record, 'Milk_per_Day_Liters', 'N/A')} Liters",
+            "monthly_income": f"₹{monthly:,}"
+        }
+
+    return cow_insights, buff_insights
+
 def get_breed_insights(breed_type: str, animal_type: str) -> Dict:
     """
-    Fetches business insights from the appropriate CSV file based on breed and animal type.
+    Fetches the pre-formatted business insights for a breed.
     Returns a dictionary with standardized keys for the frontend.
     """
     try:
-        if animal_type.lower() == "cow" and cow_breeds is not None:
-            # Filter for the specific breed
-            breed_data = cow_breeds[cow_breeds["Breed_Type"] == breed_type]
-            if not breed_data.empty:
-                record = breed_data.iloc[0]
-                return {
-                    "breed_type": str(record["Breed_Type"]),
-                    "starting_expenditure": f"₹{int(record['Cost_Of_Cow_INR']):,}",
-                    "annual_income": f"₹{int(record.get('Monthly_Income_INR', 0) * 12):,}",
-                    "farmers_percent": "--",
-                    "popular_areas": str(record.get("Popular_Areas", "N/A")),
-                    "milk_per_day": f"{record.get('Milk_Per_Day_Litres', 'N/A')} Liters",
-                    "monthly_income": f"₹{int(record.get('Monthly_Income_INR', 0)):,}"
-                }
-        
-        elif animal_type.lower() == "buffalo" and buff_breeds is not None:
-            # Filter for the specific breed
-            breed_data = buff_breeds[buff_breeds["Breed_Type"] == breed_type]
-            if not breed_data.empty:
-                record = breed_data.iloc[0]
-                return {
-                    "breed_type": str(record["Breed_Type"]),
-                    "starting_expenditure": f"₹{int(record.get('Cost_per_Buffalo_INR', 0)):,}",
-                    "annual_income": f"₹{int(record.get('Monthly_Income_per_Buffalo_INR', 0) * 12):,}",
-                    "farmers_percent": "--",
-                    "popular_areas": str(record.get("Popular_Areas", "N/A")),
-                    "milk_per_day": f"{record.get('Milk_per_Day_Liters', 'N/A')} Liters",
-                    "monthly_income": f"₹{int(record.get('Monthly_Income_per_Buffalo_INR', 0)):,}"
-                }
-        
+        cow_insights, buff_insights = _insight_tables()
+        if animal_type.lower() == "cow":
+            data = cow_insights.get(breed_type)
+        elif animal_type.lower() == "buffalo":
+            data = buff_insights.get(breed_type)
+        else:
+            data = None
+
+        if data is not None:
+            return data
+
         # If no data found, return default values
         return {
             "breed_type": breed_type,
@@ -128,25 +164,30 @@ def get_breed_insights(breed_type: str, animal_type: str) -> Dict:
             "monthly_income": "Error fetching data"
         }
 
-def get_insights_stream(animal: str, image_path: str) -> Generator[Dict, None, None]:
+def get_insights_stream(animal: str, image_features) -> Generator[Dict, None, None]:
     """
     Generator function that yields progress updates and final data.
+    Takes the CLIP image embedding already computed by the caller so the
+    vision tower runs only once per upload.
     This drives the real-time progress bar in the UI.
     """
-    # Stage 1: Initialization
+    # Stage 1: Initialization — start breed detection in the background
+    # immediately so it overlaps with the progress updates below
+    detect_future = _insights_executor.submit(detect_breed, image_features, animal)
     yield {'progress': 5, 'message': 'Initializing analysis...'}
-    
-    # Stage 2: Breed Detection
+
+    # Stage 2: Breed Detection (reuses the shared image embedding)
     yield {'progress': 30, 'message': 'Analyzing image to detect specific breed...'}
-    detected_breed = detect_breed(image_path, animal)
+    detected_breed = detect_future.result()
     yield {'progress': 50, 'message': f'Breed detected: {detected_breed}. Fetching business insights...'}
-    
-    # Stage 3: Data Lookup
+
+    # Stage 3: Data Lookup, also off-thread while the UI updates
+    insights_future = _insights_executor.submit(get_breed_insights, detected_breed, animal)
     yield {'progress': 75, 'message': 'Retrieving detailed business analytics from database...'}
-    insights_data = get_breed_insights(detected_breed, animal)
-    
+    insights_data = insights_future.result()
+
     # Stage 4: Data Processing
     yield {'progress': 90, 'message': 'Formatting and validating results...'}
-    
+
     # Stage 5: Complete
     yield {'progress': 100, 'message': '✅ Analysis complete!', 'data': insights_data}
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""
+Build-time warmup for the CLIP backbone.
+
+Serializes the model weights as a plain state dict so later boots can
+mmap-load them from the page cache instead of re-parsing safetensors (see
+the fast path in image_classifier._load_clip). Weights stay in the model's
+native dtype; the loader casts per device (fp16 on GPU, fp32 on CPU).
+Run once at container build or after a deploy:
+
+    python warmup.py
+
+The output location can be overridden with CLIP_STATE_PATH.
+"""
+import os
+
+import torch
+from transformers import CLIPModel
+
+from image_classifier import MODEL_NAME
+
+STATE_PATH = os.environ.get("CLIP_STATE_PATH", "/opt/clip_state.pt")
+
+def main():
+    model = CLIPModel.from_pretrained(MODEL_NAME)
+    torch.save(model.state_dict(), STATE_PATH)
+    print(f"Saved {MODEL_NAME} weights to {STATE_PATH}")
+
+if __name__ == "__main__":
+    main()